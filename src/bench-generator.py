@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+import argparse
+import asyncio
+import aiohttp.web
+import json
+import time
+
+# namespaces served by the stand-in (the dao namespace is a placeholder)
+namespaces = {
+    'rdf'  : 'http://www.w3.org/1999/02/22-rdf-syntax-ns#',
+    'rdfs' : 'http://www.w3.org/2000/01/rdf-schema#',
+    'owl'  : 'http://www.w3.org/2002/07/owl#',
+    'xsd'  : 'http://www.w3.org/2001/XMLSchema#',
+    'brick': 'https://brickschema.org/schema/1.1.0/Brick#',
+    'gfb'  : 'http://ss.sdu.dk/test/grundstrup-bidi-ontology/20200727/#',
+    'dao'  : 'http://localhost/bench/dao#',
+    'n'    : 'http://ss.sdu.dk/test/grundstrup-bidi/20200727/#',
+}
+
+requests = [] # (endpoint, bytes in, bytes out, seconds) per served request
+
+###############################################################################
+####################################################################### helpers
+
+def percentile (values: list, p: float):
+    if len(values)==0: return 0.0
+    values = sorted(values)
+    return values[min(len(values)-1, int(p*len(values)))]
+
+###############################################################################
+##################################################################### stand-in
+
+# Stand-in for the RDF server: answers the endpoints used by bidi-generator.py
+# after an artificial latency and records every request.
+
+def handler (endpoint: str, response: dict):
+    body = json.dumps(response)
+    
+    async def handle (request):
+        t0 = time.perf_counter()
+        data = await request.read()
+        await asyncio.sleep(args.latency/1000)
+        requests.append((endpoint, len(data), len(body), time.perf_counter()-t0))
+        return aiohttp.web.Response(text=body, content_type='application/json')
+    return handle
+
+async def standin_start ():
+    app = aiohttp.web.Application(client_max_size=1024**3)
+    app.router.add_post('/namespaces', handler('namespaces', {'success': True, 'namespaces': namespaces}))
+    app.router.add_put ('/query'     , handler('query'     , {'success': True, 'resultset': []}))
+    app.router.add_post('/update'    , handler('update'    , {'success': True}))
+    app.router.add_post('/store'     , handler('store'     , {'success': True}))
+    
+    runner = aiohttp.web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = aiohttp.web.TCPSite(runner, '127.0.0.1', args.port)
+    await site.start()
+    return runner, runner.addresses[0][1]
+
+###############################################################################
+##################################################################### benchmark
+
+async def bench (port: int, buildings: int):
+    requests.clear()
+    
+    argv = [os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bidi-generator.py'),
+            namespaces['n'], '127.0.0.1', str(port),
+            '--buildings', str(buildings), '--label-prefix', 'b{building}_', '--log-level', 'warning']+args.generator_args
+    
+    t0 = time.perf_counter()
+    process = await asyncio.create_subprocess_exec(sys.executable, *argv)
+    if await process.wait() != 0:
+        print('ERROR: Generator failed for %u buildings' % buildings)
+        sys.exit(3)
+    wall = time.perf_counter()-t0
+    
+    latencies = [r[3] for r in requests]
+    result = {
+        'buildings': buildings,
+        'requests' : len(requests),
+        'bytes_in' : sum(r[1] for r in requests),
+        'bytes_out': sum(r[2] for r in requests),
+        'wall'     : wall,
+        'p50'      : percentile(latencies, 0.50),
+        'p99'      : percentile(latencies, 0.99),
+        'endpoints': {},
+    }
+    for r in requests:
+        result['endpoints'][r[0]] = result['endpoints'].get(r[0], 0)+1
+    return result
+
+def report (results: list, baseline: dict):
+    print('%9s %9s %12s %9s %9s %9s %s' % ('buildings', 'requests', 'bytes sent', 'wall [s]', 'p50 [ms]', 'p99 [ms]', 'vs. baseline'))
+    for result in results:
+        line = '%9u %9u %12u %9.3f %9.2f %9.2f' % (result['buildings'], result['requests'], result['bytes_in'],
+                                                   result['wall'], result['p50']*1000, result['p99']*1000)
+        if str(result['buildings']) in baseline:
+            base = baseline[str(result['buildings'])]
+            line += ' requests x%.2f, wall x%.2f' % (result['requests']/max(base['requests'], 1),
+                                                     result['wall']/max(base['wall'], 1e-9))
+        print(line)
+
+###############################################################################
+########################################################################## main
+
+async def main ():
+    runner, port = await standin_start()
+    try:
+        results = []
+        for buildings in args.sizes:
+            results.append(await bench(port, buildings))
+    finally:
+        await runner.cleanup()
+    
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as fo:
+            baseline = json.load(fo)
+    report(results, baseline)
+    
+    if args.record:
+        with open(args.record, 'w') as fo:
+            json.dump({str(r['buildings']): r for r in results}, fo, indent=4, sort_keys=True)
+
+# guard: commandline arguments
+parser = argparse.ArgumentParser(description='Benchmark bidi-generator.py against a local stand-in RDF server.',
+                                 epilog='example: %s --sizes 1,10,100 --latency 2 --record baseline.json -- --batch-size 0' % sys.argv[0])
+parser.add_argument('--sizes', type=lambda value: [int(size) for size in value.split(',')], default=[1, 10, 100],
+                    help='comma separated numbers of buildings to generate (default: 1,10,100)')
+parser.add_argument('--latency', type=float, default=0,
+                    help='artificial latency in milliseconds added to every request (default: %(default)s)')
+parser.add_argument('--port', type=int, default=0,
+                    help='port of the stand-in server (default: any free port)')
+parser.add_argument('--record', metavar='FILE',
+                    help='write the results to FILE for use as a later --baseline')
+parser.add_argument('--baseline', metavar='FILE',
+                    help='compare against results recorded earlier with --record')
+parser.add_argument('generator_args', nargs=argparse.REMAINDER,
+                    help='extra arguments for bidi-generator.py, after "--"')
+args = parser.parse_args()
+if args.generator_args[:1]==['--']:
+    args.generator_args = args.generator_args[1:]
+
+asyncio.run(main())
+
+########################################################################### EOF
+###############################################################################
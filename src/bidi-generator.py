@@ -1,124 +1,112 @@
 #!/usr/bin/env python3
 
 import sys
+import os
+import shutil
+import argparse
 import asyncio
-import aiohttp
+import codecs
+import hashlib
 import json
+import logging
+import time
 
-namespaces = {}
+log = logging.getLogger('bidi-generator')
+
+namespaces = {} # namespace iri -> compact prefix (e.g., 'rdf:')
+prefixes   = {} # prefix -> namespace iri
 broker = "tcp://localhost:1883"
 
+batch_size    = 256 # triples per flushed update, 0 means one update per call
+batch_pending = []  # insert triples not yet flushed
+instances  = {} # (datatype, label) -> name of every typed, labelled entity
+
+session  = None # shared keep-alive http client, created in main()
+inflight = None # bounds the number of concurrent requests on session
+
+journal      = None  # append-only file of acknowledged operations (--journal)
+journal_done = set() # digests of triples and updates acknowledged by the server
+
+stats = {}   # request type -> counters, see stats_add()
+trace = None # file receiving one json span per line (--trace)
+
+graph  = None # local rdflib graph replacing the server (offline backend)
+stream = None # output file when streaming N-Triples (offline backend)
+
+# namespaces known without a server, extended by --namespaces and --prefix
+offline_namespaces = {
+    'rdf'  : 'http://www.w3.org/1999/02/22-rdf-syntax-ns#',
+    'rdfs' : 'http://www.w3.org/2000/01/rdf-schema#',
+    'owl'  : 'http://www.w3.org/2002/07/owl#',
+    'xsd'  : 'http://www.w3.org/2001/XMLSchema#',
+    'brick': 'https://brickschema.org/schema/1.1.0/Brick#',
+    'gfb'  : 'http://ss.sdu.dk/test/grundstrup-bidi-ontology/20200727/#',
+}
+
 ###############################################################################
 ####################################################################### helpers
 
 def valid_python_version ():
     v = sys.version_info
     if v[0] != 3: return False
-    if v[1] < 5: return False
+    if v[1] < 6: return False
     return True
 
 ###############################################################################
 #################################################################### processing
 
-async def attach_mqtt_dao (prefix, entity, topic):
-    topic = '/building1/'+topic
+def attach_mqtt_dao (prefix, entity, label, topic, broker):
+    MqttLiveData    = instance(prefix, 'dao:MqttLiveData' , label)
+    hasBroker       = relate(MqttLiveData , 'dao:hasBroker', '"%s"' % broker)
+    hasTopic        = relate(MqttLiveData , 'dao:hasTopic', '"%s"' % topic)
+    hasMqttLiveData = relate(entity , 'dao:hasMqttLiveData', MqttLiveData)
+
+def process_label_prefix (spec: dict, buildings: range):
+    label_prefix = args.label_prefix if args.label_prefix!=None else spec.get('label_prefix', '')
     
-    MqttLiveData    = await model_ensure_instance(prefix, 'dao:MqttLiveData' , escape('data'+topic))
-    hasBroker       = await model_ensure_relationship(MqttLiveData , 'dao:hasBroker', '"%s"' % broker)
-    hasTopic        = await model_ensure_relationship(MqttLiveData , 'dao:hasTopic', '"%s"' % topic)
-    hasMqttLiveData = await model_ensure_relationship(entity , 'dao:hasMqttLiveData', MqttLiveData)
+    # names are minted from labels, so they must differ between buildings
+    if len(buildings)>1 and not '{building}' in label_prefix:
+        log.error('Label prefix "%s" must contain "{building}" to stamp out several buildings', label_prefix)
+        sys.exit(5)
+    return label_prefix
 
 async def process ():
-    # instances
-    prefix = 'n:'
-    dh   = await model_ensure_instance(prefix, 'gfb:District_Heat' , escape('district_heat'))
-    hx   = await model_ensure_instance(prefix, 'gfb:Heat_Exchanger', escape('heat_exchanger'))
-    tank      = await model_ensure_instance(prefix, 'gfb:Hot_Water_Tank'          , escape('hot_water_tank'))
-    tank_temp = await model_ensure_instance(prefix, 'gfb:Water_Temperature_Sensor', escape('hot_water_tank_temperature'))
-    d_ret_flow  = await model_ensure_instance(prefix, 'gfb:Water_Flow_Sensor'                 , escape('district_flow'))
-    d_ret_temp  = await model_ensure_instance(prefix, 'gfb:Water_Temperature_Sensor'          , escape('district_return_temp'))
-    d_sup_temp  = await model_ensure_instance(prefix, 'gfb:Water_Temperature_Sensor'          , escape('district_supply_temp'))
-    d_ret_valve = await model_ensure_instance(prefix, 'gfb:Valve'                             , escape('district_return_valve'))
-    d_ret_pres  = await model_ensure_instance(prefix, 'gfb:Water_Pressure_Sensor'             , escape('district_return_pressure'))
-    d_sup_pres  = await model_ensure_instance(prefix, 'gfb:Water_Pressure_Sensor'             , escape('district_supply_pressure'))
-    d_dif_pres  = await model_ensure_instance(prefix, 'gfb:Water_Differential_Pressure_Sensor', escape('district_differential_pressure'))
-    d_heat      = await model_ensure_instance(prefix, 'gfb:Heat_Meter'                        , escape('district_heat_meter'))
-    h_sup_temp = await model_ensure_instance(prefix, 'gfb:Water_Temperature_Sensor', escape('heated_supply_temp'))
-    h_l1_sup_valve = await model_ensure_instance(prefix, 'gfb:Valve'                   , escape('heated_loop1_supply_valve'))
-    h_l1_sup_temp  = await model_ensure_instance(prefix, 'gfb:Water_Temperature_Sensor', escape('heated_loop1_supply_temp'))
-    h_l1_sup_pump  = await model_ensure_instance(prefix, 'gfb:Pump'                    , escape('heated_loop1_supply_pump'))
-    h_l1_radiator  = await model_ensure_instance(prefix, 'gfb:Radiator'                , escape('heated_loop1_radiator'))
-    h_l2_sup_bvalve    = await model_ensure_instance(prefix, 'gfb:Bypass_Valve'            , escape('heated_loop2_supply_bypass_valve'))
-    h_l2_sup_temp      = await model_ensure_instance(prefix, 'gfb:Water_Temperature_Sensor', escape('heated_loop2_supply_temp'))
-    h_l2_ret_pump      = await model_ensure_instance(prefix, 'gfb:Pump'                    , escape('heated_loop2_return_pump'))
-    h_l2_ret_temp_pre  = await model_ensure_instance(prefix, 'gfb:Water_Temperature_Sensor', escape('heated_loop2_return_prebypass_temp'))
-    h_l2_ret_temp_post = await model_ensure_instance(prefix, 'gfb:Water_Temperature_Sensor', escape('heated_loop2_return_postbypass_temp'))
-    h_l2_radiator      = await model_ensure_instance(prefix, 'gfb:Radiator'                , escape('heated_loop2_radiator'))
-    h_l3_ret_valve = await model_ensure_instance(prefix, 'gfb:Valve', escape('heated_loop3_return_valve'))
-    
-    # attach data sources
-    await attach_mqtt_dao(prefix, tank_temp  , 'tank/temp')
-    await attach_mqtt_dao(prefix, d_ret_flow , 'district/return/flow')
-    await attach_mqtt_dao(prefix, d_ret_temp , 'district/return/temp')
-    await attach_mqtt_dao(prefix, d_sup_temp , 'district/supply/temp')
-    await attach_mqtt_dao(prefix, d_ret_valve, 'district/return/valve/position')
-    await attach_mqtt_dao(prefix, d_ret_pres , 'district/return/pressure')
-    await attach_mqtt_dao(prefix, d_sup_pres , 'district/supply/pressure')
-    await attach_mqtt_dao(prefix, d_dif_pres , 'district/differential/pressure')
-    await attach_mqtt_dao(prefix, d_heat     , 'district/heat')
-    await attach_mqtt_dao(prefix, h_sup_temp, 'heated/supply/temp')
-    await attach_mqtt_dao(prefix, h_l1_sup_valve, 'heated/loop1/supply/valve/position') # TODO: should be attached to a sensor on the valve
-    await attach_mqtt_dao(prefix, h_l1_sup_temp , 'heated/loop1/supply/temp')
-    await attach_mqtt_dao(prefix, h_l1_sup_pump , 'heated/loop1/supply/pump/rpm') # TODO: should be attached to a sensor on the pump
-    await attach_mqtt_dao(prefix, h_l2_sup_bvalve   , 'heated/loop2/supply/bypass-valve/position') # TODO: should be attached to a sensor on the bypass valve
-    await attach_mqtt_dao(prefix, h_l2_sup_temp     , 'heated/loop2/supply/temp')
-    await attach_mqtt_dao(prefix, h_l2_ret_pump     , 'heated/loop2/return/pump/rpm') # TODO: should be attached to a sensor on the pump
-    await attach_mqtt_dao(prefix, h_l2_ret_temp_pre , 'heated/loop2/return/temp/pre')
-    await attach_mqtt_dao(prefix, h_l2_ret_temp_post, 'heated/loop2/return/temp/post')
-    await attach_mqtt_dao(prefix, h_l3_ret_valve, 'heated/loop3/return/valve/position') # TODO: should be attached to a sensor on the valve
-    
-    # relations: district heated water
-    await model_ensure_relationship(dh         , 'gfb:feedsSupplyDistrictHeatedWater', d_sup_temp)
-    await model_ensure_relationship(d_sup_temp , 'gfb:feedsSupplyDistrictHeatedWater', d_sup_pres)
-    await model_ensure_relationship(d_sup_pres , 'gfb:feedsSupplyDistrictHeatedWater', hx)
-    await model_ensure_relationship(hx         , 'gfb:feedsReturnDistrictHeatedWater', d_ret_pres)
-    await model_ensure_relationship(d_ret_pres , 'gfb:feedsReturnDistrictHeatedWater', d_ret_valve)
-    await model_ensure_relationship(d_ret_valve, 'gfb:feedsReturnDistrictHeatedWater', d_ret_temp)
-    await model_ensure_relationship(d_ret_temp , 'gfb:feedsReturnDistrictHeatedWater', d_ret_flow)
-    await model_ensure_relationship(d_sup_temp, 'gfb:controls', d_heat)
-    await model_ensure_relationship(d_ret_temp, 'gfb:controls', d_heat)
-    await model_ensure_relationship(d_ret_flow, 'gfb:controls', d_heat)
-    await model_ensure_relationship(d_sup_pres, 'gfb:controls', d_dif_pres)
-    await model_ensure_relationship(d_ret_pres, 'gfb:controls', d_dif_pres)
-    
-    # relations: heated
-    await model_ensure_relationship(hx, 'gfb:feedsSupplyHeatedWater', h_sup_temp)
-    
-    # relations: heated loop 1
-    await model_ensure_relationship(h_sup_temp    , 'gfb:feedsSupplyHeatedWater', h_l1_sup_valve)
-    await model_ensure_relationship(h_l1_sup_valve, 'gfb:feedsSupplyHeatedWater', h_l1_sup_temp)
-    await model_ensure_relationship(h_l1_sup_temp , 'gfb:feedsSupplyHeatedWater', h_l1_sup_pump)
-    await model_ensure_relationship(h_l1_sup_pump , 'gfb:feedsSupplyHeatedWater', h_l1_radiator)
-    await model_ensure_relationship(h_l1_radiator , 'gfb:feedsReturnHeatedWater', hx)
-    
-    # relations: heated loop 2
-    await model_ensure_relationship(h_sup_temp        , 'gfb:feedsSupplyHeatedWater', h_l2_sup_bvalve)
-    await model_ensure_relationship(h_l2_sup_bvalve   , 'gfb:feedsSupplyHeatedWater', h_l2_sup_temp)
-    await model_ensure_relationship(h_l2_sup_temp     , 'gfb:feedsSupplyHeatedWater', h_l2_radiator)
-    await model_ensure_relationship(h_l2_radiator     , 'gfb:feedsReturnHeatedWater', h_l2_ret_pump)
-    await model_ensure_relationship(h_l2_ret_pump     , 'gfb:feedsReturnHeatedWater', h_l2_ret_temp_pre)
-    await model_ensure_relationship(h_l2_ret_temp_pre , 'gfb:feedsReturnHeatedWater', h_l2_sup_bvalve)
-    await model_ensure_relationship(h_l2_ret_temp_pre , 'gfb:feedsReturnHeatedWater', h_l2_ret_temp_post)
-    await model_ensure_relationship(h_l2_ret_temp_post, 'gfb:feedsReturnHeatedWater', hx)
-    
-    # relations: heated loop 3
-    await model_ensure_relationship(h_sup_temp    , 'gfb:feedsSupplyHeatedWater', tank)
-    await model_ensure_relationship(tank_temp     , 'brick:isPointOf'           , tank)
-    await model_ensure_relationship(tank          , 'gfb:feedsReturnHeatedWater', h_l3_ret_valve)
-    await model_ensure_relationship(h_l3_ret_valve, 'gfb:feedsReturnHeatedWater', hx)
+    spec         = topology_load(args.topology)
+    prefix       = spec.get('prefix', 'n:')
+    buildings    = range(args.first_building, args.first_building+args.buildings)
+    label_prefix = process_label_prefix(spec, buildings)
     
-    # store resulting model
-    await rdf_store()
+    # fail before building anything rather than on the first flush
+    missing = topology_prefixes(spec, prefix.format(building=buildings[0]))-set(prefixes)
+    if missing:
+        log.error('Namespace not defined for prefix(es) %s (see --prefix or --namespaces)', ', '.join('"%s"' % p for p in sorted(missing)))
+        sys.exit(7)
+    
+    # keep a bounded window of buildings in flight so memory stays flat
+    keys = []
+    for i, building in enumerate(buildings):
+        names = {}
+        building_prefix = prefix.format(building=building)
+        for step in topology_compile(spec, building, label_prefix):
+            if step[0]=='instance':
+                _, key, datatype, label = step
+                names[key] = instance(building_prefix, datatype, label)
+                keys.append((datatype, label))
+            elif step[0]=='mqtt':
+                _, key, label, topic, broker = step
+                attach_mqtt_dao(building_prefix, names[key], label, topic, broker)
+                keys.append(('dao:MqttLiveData', label))
+            elif step[0]=='relate':
+                _, sub, pred, obj = step
+                relate(names[sub], pred, names[obj])
+        
+        if (i+1)%args.window==0 or building==buildings[-1]:
+            await schedule_drain()
+            
+            # labels are unique per building, so these are never looked up again
+            for key in keys:
+                instances.pop(key, None)
+            keys = []
 
 def escape (value: str):
     value = value.replace(' ', '_space_')
@@ -132,130 +120,482 @@ def escape (value: str):
     value = value.replace('Å', '_AA_')
     return value
 
+###############################################################################
+###################################################################### topology
+
+# A topology spec (JSON, or YAML when PyYAML is available) declares the plant:
+# components with their type, label and optional MQTT topic, and named groups
+# of relations between components. prefix, label_prefix and topic_root may use
+# "{building}" to stamp out many buildings from one spec.
+
+def topology_load (filename: str):
+    with open(filename) as fo:
+        if filename.endswith('.yaml') or filename.endswith('.yml'):
+            import yaml
+            return yaml.safe_load(fo)
+        return json.load(fo)
+
+def topology_prefixes (spec: dict, prefix: str):
+    # prefixes of every term the spec makes process() emit
+    terms = [prefix, 'rdf:type', 'rdf:label']
+    terms += [component['type'] for component in spec['components'].values()]
+    for group in spec.get('relations', {}):
+        terms += [pred for sub, pred, obj in spec['relations'][group]]
+    if any('topic' in component for component in spec['components'].values()):
+        terms.append('dao:MqttLiveData')
+    return set(term.split(':', 1)[0] for term in terms)
+
+def topology_compile (spec: dict, building: int, label_prefix: str = ''):
+    label_prefix = label_prefix.format(building=building)
+    topic_root   = spec.get('topic_root', '/').format(building=building)
+    components   = spec['components']
+    
+    for key in components:
+        component = components[key]
+        yield 'instance', key, component['type'], escape(label_prefix+component['label'])
+    
+    for key in components:
+        if 'topic' in components[key]:
+            topic = topic_root+components[key]['topic']
+            yield 'mqtt', key, escape(label_prefix+'data'+topic), topic, spec.get('broker', broker)
+    
+    for group in spec.get('relations', {}):
+        for sub, pred, obj in spec['relations'][group]:
+            for key in (sub, obj):
+                if not key in components:
+                    raise ValueError('Unknown component "%s" in relation group "%s"' % (key, group))
+            yield 'relate', sub, pred, obj
+
 ###############################################################################
 ######################################################################### model
 
 async def model_ensure_instance (prefix: str, datatype: str, label: str):
-    q = '''
-    SELECT ?name
-    WHERE {
-        ?name rdf:type %s .
-        ?name rdf:label "%s" .
-    }
-    ''' % (datatype, label)
-    success, rs = await rdf_query(q)
-    
-    if success and len(rs)>0:
-        name = rs[0][0]
-        if '#' in name:
-            parts = name.split('#')
-            if len(parts)!=2:
-                print('ERROR: Unknown format of entity "%s".' % name)
-            parts[0] += '#'
-            if parts[0] in namespaces:
-                name = '%s:%s' % (namespaces[parts[0]], parts[1])
-            else:
-                print('ERROR: Namespace not defined for entity "%s".' % name)
-    else:
-        name = '%s_%s' % (prefix, label)
-        await rdf_update_split(insert_clause=['%s rdf:type %s' % (name, datatype),
-                                              '%s rdf:label "%s"' % (name, label)])
+    key = (datatype, label)
+    if key in instances:
+        return instances[key]
+    
+    name = '%s_%s' % (prefix, label)
+    instances[key] = name
+    await batch_update(insert_clause=['%s rdf:type %s' % (name, datatype),
+                                      '%s rdf:label "%s"' % (name, label)])
     return name
 
 async def model_ensure_relationship (sub: str, pred: str, obj: str, onlyobj=False):
     if onlyobj:
-        await rdf_update_split(delete_clause=['%s %s ?obj' % (sub, pred)],
-                               where_clause=['%s %s ?obj' % (sub, pred)])
+        await batch_update(delete_clause=['%s %s ?obj' % (sub, pred)],
+                           where_clause=['%s %s ?obj' % (sub, pred)])
+    
+    await batch_update(insert_clause=['%s %s %s' % (sub, pred, obj)])
+
+###############################################################################
+######################################################################### index
+
+def compact (name: str):
+    iri, sep, local = name.rpartition('#')
+    prefix = namespaces.get(iri+sep)
+    return prefix+local if prefix else None
+
+async def index_load ():
+    q = '''
+    SELECT ?name ?type ?label
+    WHERE {
+        ?name rdf:type ?type .
+        ?name rdf:label ?label .
+    }
+    '''
+    try:
+        async for name, datatype, label in rdf_query_stream(q):
+            name     = compact(name)
+            datatype = compact(datatype)
+            
+            # entities outside the known namespaces can never be looked up
+            if name and datatype:
+                instances[(datatype, label)] = name
+    except ValueError as e:
+        log.error('Exception while trying to parse result of entity index query: %s', e)
+        return False
+    return True
+
+###############################################################################
+#################################################################### scheduling
+
+# Steps are scheduled as tasks right away and run concurrently. A step only
+# awaits the steps it depends on (e.g., a relationship awaits its two
+# endpoints), so wall-clock time follows the depth of the dependency graph.
+
+scheduled = []
+
+def schedule (coro):
+    task = asyncio.ensure_future(coro)
+    scheduled.append(task)
+    return task
+
+async def schedule_drain ():
+    while scheduled:
+        tasks = scheduled[:]
+        scheduled.clear()
+        await asyncio.gather(*tasks)
+
+async def resolve (value):
+    if asyncio.isfuture(value):
+        return await value
+    return value
+
+def instance (prefix: str, datatype: str, label: str):
+    return schedule(model_ensure_instance(prefix, datatype, label))
+
+def relate (sub, pred: str, obj, onlyobj=False):
+    async def step ():
+        s, o = await asyncio.gather(resolve(sub), resolve(obj))
+        await model_ensure_relationship(s, pred, o, onlyobj)
+    return schedule(step())
+
+###############################################################################
+###################################################################### batching
+
+async def batch_update (insert_clause: list = None, delete_clause: list = None, where_clause: list = None):
+    global batch_pending
+    
+    # fallback: one update per call (deletes always go this way to keep ordering)
+    if batch_size <= 0 or delete_clause or where_clause:
+        await batch_flush()
+        await batch_commit(insert_clause, delete_clause, where_clause)
+        return
+    
+    batch_pending.extend(insert_clause)
+    if len(batch_pending) >= batch_size:
+        await batch_flush()
+
+async def batch_flush ():
+    global batch_pending
+    
+    # swap buffer before awaiting so concurrent callers start a fresh batch
+    pending, batch_pending = batch_pending, []
+    step = max(batch_size, 1)
+    for i in range(0, len(pending), step):
+        await batch_commit(pending[i:i+step])
+
+async def batch_commit (insert_clause: list = None, delete_clause: list = None, where_clause: list = None):
+    # a rejected batch loses all of its triples, so never go on to store a
+    # partial model as if the run had succeeded
+    if not await journal_update(insert_clause, delete_clause, where_clause):
+        log.error('Update of %u triples was rejected, aborting with an incomplete model',
+                  len(insert_clause or [])+len(delete_clause or []))
+        sys.exit(8)
+
+###############################################################################
+####################################################################### journal
+
+# Every update acknowledged by the server is appended to the journal as the
+# digests of its insert triples (or of the whole update when it deletes). A
+# restarted run reads the journal back and drops everything that was already
+# acknowledged, so it resumes after the last committed batch. Digests are per
+# triple, so batch boundaries may differ between runs. Instance names are
+# derived from their labels and need no journalling.
+
+def journal_digest (value: str):
+    return hashlib.blake2b(value.encode('utf-8'), digest_size=8).hexdigest()
+
+def journal_open (filename: str):
+    global journal
+    
+    if os.path.exists(filename):
+        with open(filename) as fo:
+            for line in fo:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue # torn last line of an interrupted run
+                if entry['op'] == 'done':
+                    journal_done.update(entry['digests'])
+    
+    journal = open(filename, 'a', buffering=1)
+    log.info('Journal "%s": %u acknowledged operations', filename, len(journal_done))
+
+def journal_write (entry: dict):
+    if journal:
+        journal.write(json.dumps(entry, sort_keys=True)+'\n')
+
+async def journal_update (insert_clause: list = None, delete_clause: list = None, where_clause: list = None):
+    if journal:
+        if delete_clause or where_clause:
+            digests = [journal_digest(json.dumps([insert_clause, delete_clause, where_clause]))]
+            if digests[0] in journal_done:
+                return True
+        else:
+            insert_clause = [clause for clause in insert_clause if not journal_digest(clause) in journal_done]
+            digests = list(map(journal_digest, insert_clause))
+            if not insert_clause:
+                return True
+    
+    success = await rdf_update_split(insert_clause=insert_clause, delete_clause=delete_clause, where_clause=where_clause)
+    if success and journal:
+        journal_done.update(digests)
+        journal_write({'op': 'done', 'digests': digests})
+    return success
+
+###############################################################################
+############################################################### instrumentation
+
+def stats_add (name: str, start: float, bytes_out: int = 0, bytes_in: int = 0):
+    duration = time.perf_counter()-start
     
-    await rdf_update_split(insert_clause=['%s %s %s' % (sub, pred, obj)])
+    entry = stats.get(name)
+    if entry == None:
+        entry = stats[name] = {'count': 0, 'seconds': 0.0, 'bytes_out': 0, 'bytes_in': 0}
+    entry['count']     += 1
+    entry['seconds']   += duration
+    entry['bytes_out'] += bytes_out
+    entry['bytes_in']  += bytes_in
+    
+    if trace:
+        trace.write(json.dumps({'name': name, 'start': start, 'duration': duration,
+                                'bytes_out': bytes_out, 'bytes_in': bytes_in})+'\n')
+
+def stats_merge (filename: str):
+    # add the counters written by a shard worker
+    with open(filename) as fo:
+        for name, counters in json.load(fo).items():
+            entry = stats.setdefault(name, {'count': 0, 'seconds': 0.0, 'bytes_out': 0, 'bytes_in': 0})
+            for key in entry:
+                entry[key] += counters[key]
+
+def stats_report ():
+    for name in sorted(stats):
+        entry = stats[name]
+        log.info('%-10s %8u calls %10.3f s %12u bytes out %12u bytes in',
+                 name, entry['count'], entry['seconds'], entry['bytes_out'], entry['bytes_in'])
+    
+    if args.stats:
+        with open(args.stats, 'w') as fo:
+            json.dump(stats, fo, indent=4, sort_keys=True)
+
+def json_encode (value):
+    start = time.perf_counter()
+    text = json.dumps(value, sort_keys=True, indent=4, separators=(',', ': '))
+    stats_add('json.dumps', start)
+    return text
+
+def json_decode (text: str):
+    start = time.perf_counter()
+    value = json.loads(text)
+    stats_add('json.loads', start)
+    return value
 
 ###############################################################################
 ########################################################################### rdf
 
+async def rdf_request (method: str, path: str, data: str):
+    url = 'http://%s:%u/%s' % (host, port, path)
+    data = data.encode('utf-8')
+    for attempt in range(args.retries+1):
+        try:
+            async with inflight:
+                start = time.perf_counter()
+                async with session.request(method, url, data=data) as response:
+                    body = await response.read()
+                stats_add(path, start, len(data), len(body))
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            if attempt == args.retries: raise
+            await rdf_backoff(attempt, path, e)
+            continue
+        
+        if response.status < 500 or attempt == args.retries:
+            return response.status, body.decode('utf-8')
+        await rdf_backoff(attempt, path, 'status %d' % response.status)
+
+async def rdf_backoff (attempt: int, path: str, reason):
+    delay = args.backoff*2**attempt
+    log.warning('Request to /%s failed (%s), retrying in %.1f s', path, reason, delay)
+    await asyncio.sleep(delay)
+
 async def rdf_namespaces ():
-    url = 'http://%s:%u/namespaces' % (host, port)
-    async with aiohttp.ClientSession() as session:
-        async with session.post(url, data='"dummy"') as response:
-            text = await response.text()
-            
-            if response.status != 200:
-                print('ERROR: Unable to lookup namespaces')
-                print(text)
-                return False, {}
-            
-            try:
-                return True, json.loads(text)
-            except Exception as e:
-                print('ERROR: Exception while trying to parse result of namespace lookup')
-                print(text)
-                print(str(e))
-                return False, {}
+    if graph is not None or stream is not None: return graph_namespaces()
+    if args.namespace_cache:
+        ns = namespace_cache_load(args.namespace_cache)
+        if ns: return True, ns
+    status, text = await rdf_request('POST', 'namespaces', '"dummy"')
+    
+    if status != 200:
+        log.error('Unable to lookup namespaces: %s', text)
+        return False, {}
+    
+    try:
+        ns = json_decode(text)
+    except Exception as e:
+        log.error('Exception while trying to parse result of namespace lookup: %s\n%s', e, text)
+        return False, {}
+    
+    if args.namespace_cache and ns.get('success'):
+        namespace_cache_store(args.namespace_cache, ns)
+    return True, ns
+
+# The namespace map rarely changes, so it is cached on disk for runs started in
+# quick succession. The server offers no version of the map to revalidate
+# against; an entry is trusted for --namespace-ttl seconds and only for the
+# server that served it.
+
+def namespace_cache_load (filename: str):
+    try:
+        with open(filename) as fo:
+            entry = json.load(fo)
+    except (OSError, ValueError):
+        return None
+    
+    if entry.get('server') != '%s:%u' % (host, port):
+        return None
+    if not 0 <= time.time()-entry.get('time', 0) < args.namespace_ttl:
+        return None
+    log.debug('Using cached namespaces from "%s"', filename)
+    return entry['namespaces']
+
+def namespace_cache_store (filename: str, ns: dict):
+    entry = {'server': '%s:%u' % (host, port), 'time': time.time(), 'namespaces': ns}
+    with open(filename+'.tmp', 'w') as fo:
+        json.dump(entry, fo)
+    os.replace(filename+'.tmp', filename)
 
 async def rdf_store ():
-    url = 'http://%s:%u/store' % (host, port)
-    async with aiohttp.ClientSession() as session:
-        async with session.post(url, data='"dummy"') as response:
-            text = await response.text()
-            
-            if response.status != 200:
-                print('ERROR: Unable to store model')
-                print(text)
-                return False
-            
-            print('NOTICE: Successfully stored model')
-            return True
+    if stream is not None: return stream_store()
+    if graph is not None: return graph_store()
+    status, text = await rdf_request('POST', 'store', '"dummy"')
+    
+    if status != 200:
+        log.error('Unable to store model: %s', text)
+        return False
+    
+    log.info('Successfully stored model')
+    return True
 
 async def rdf_query (query: str):
-    query = json.dumps(query, sort_keys=True, indent=4, separators=(',', ': '))
+    if stream is not None: return stream_query(query)
+    if graph is not None: return graph_query(query)
+    query = json_encode(query)
+    status, text = await rdf_request('PUT', 'query', query)
+    
+    if status != 200:
+        log.error('Unable to query model: %s\n%s', text, query)
+        1/0
+        return False, None
+    
+    try:
+        return True, json_decode(text)['resultset']
+    except Exception as e:
+        log.error('Exception while trying to parse result model query: %s\n%s', e, text)
+        return False, None
+
+async def rdf_query_stream (query: str):
+    # rows are parsed and yielded as the response arrives, so memory use does
+    # not depend on the size of the result set
+    if stream is not None:
+        return
+    if graph is not None:
+        for row in graph_query(query)[1]:
+            yield row
+        return
+    
     url = 'http://%s:%u/query' % (host, port)
-    async with aiohttp.ClientSession() as session:
-        async with session.put(url, data=query) as response:
-            text = await response.text()
-            
-            if response.status != 200:
-                print('ERROR: Unable to query model')
-                print(query)
-                print(text)
-                1/0
-                return False, None
-            
+    data = json_encode(query).encode('utf-8')
+    async with inflight:
+        # retry until the response starts, rows already yielded cannot be undone
+        for attempt in range(args.retries+1):
+            start = time.perf_counter()
             try:
-                return True, json.loads(text)['resultset']
-            except Exception as e:
-                print('ERROR: Exception while trying to parse result model query')
-                print(text)
-                print(str(e))
-                return False, None
+                response = await session.request('PUT', url, data=data)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt == args.retries: raise
+                await rdf_backoff(attempt, 'query', e)
+                continue
+            if response.status < 500 or attempt == args.retries:
+                break
+            response.release()
+            await rdf_backoff(attempt, 'query', 'status %d' % response.status)
+    
+    # the inflight slot is released once the response has started, so callers
+    # may issue requests while iterating (the response keeps its pooled
+    # connection until the last row)
+    async with response:
+        if response.status != 200:
+            log.error('Unable to query model: %s\n%s', await response.text(), query)
+            1/0
+        
+        received = 0
+        async def chunks ():
+            nonlocal received
+            async for chunk in response.content.iter_chunked(1<<16):
+                received += len(chunk)
+                yield chunk
+        
+        async for row in resultset_rows(chunks()):
+            yield row
+    stats_add('query', start, len(data), received)
 
-async def rdf_update (query: str):
-    query = json.dumps(query, sort_keys=True, indent=4, separators=(',', ': '))
-    url = 'http://%s:%u/update' % (host, port)
-    async with aiohttp.ClientSession() as session:
-        async with session.post(url, data=query) as response:
-            text = await response.text()
-            
-            if response.status != 200:
-                print('ERROR: Unable to update model with status "%d"' % response.status)
-                print(text)
-                1/0
-                return False
-            
+async def resultset_rows (chunks):
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    parser  = json.JSONDecoder()
+    buffer  = ''
+    pos     = 0
+    state   = 'key' # key -> rows -> done
+    
+    async for chunk in chunks:
+        buffer = buffer[pos:]+decoder.decode(chunk)
+        pos = 0
+        
+        # find the start of the resultset array
+        if state == 'key':
+            i = buffer.find('"resultset"')
+            j = buffer.find('[', i) if i>=0 else -1
+            if j < 0:
+                pos = i if i>=0 else max(0, len(buffer)-len('"resultset"'))
+                continue
+            pos   = j+1
+            state = 'rows'
+        
+        # yield every complete row, an incomplete one waits for the next chunk
+        while state == 'rows':
+            while pos<len(buffer) and buffer[pos] in ' \t\r\n,':
+                pos += 1
+            if pos >= len(buffer):
+                break
+            if buffer[pos] == ']':
+                state = 'done'
+                break
             try:
-                r = json.loads(text)
-                if not 'success' in r or type(r['success'])!=bool:
-                    print('ERROR: Unable to parse result of model update')
-                    print(text)
-                    return False
-                
-                print('NOTICE: Success of model update: '+str(r['success']))
-                return r['success']
-            except:
-                print('ERROR: Exception while trying to parse result of model update')
-                print(text)
-                print(str(e))
-                return False
+                row, pos = parser.raw_decode(buffer, pos)
+            except ValueError:
+                break
+            yield row
+    
+    if state != 'done':
+        raise ValueError('Truncated or malformed resultset near "%s"' % buffer[pos:pos+80])
+
+async def rdf_update (query: str):
+    query = json_encode(query)
+    status, text = await rdf_request('POST', 'update', query)
+    
+    if status != 200:
+        log.error('Unable to update model with status "%d": %s', status, text)
+        1/0
+        return False
+    
+    try:
+        r = json_decode(text)
+        if not 'success' in r or type(r['success'])!=bool:
+            log.error('Unable to parse result of model update: %s', text)
+            return False
+        
+        if not r['success']:
+            log.warning('Model update was not successful: %s', text)
+        else:
+            log.debug('Success of model update: %s', r['success'])
+        return r['success']
+    except Exception as e:
+        log.error('Exception while trying to parse result of model update: %s\n%s', e, text)
+        return False
 
 async def rdf_update_split (ns : list = None, insert_clause : str = None, delete_clause : str = None, where_clause : str = None):
+    if stream is not None: return stream_update(insert_clause, delete_clause)
+    if graph is not None: return graph_update(insert_clause, delete_clause)
     if ns == None: ns = []
     
     q = []
@@ -283,47 +623,382 @@ async def rdf_update_split (ns : list = None, insert_clause : str = None, delete
     q.append('}')
     
     q = ''.join(map(lambda line: '%s\n' % line, q))
-    print(q)
+    log.debug('%s', q)
     
     r = await rdf_update(q)
-    print('response:', r)
+    log.debug('response: %s', r)
+    return r
+
+async def rdf_load (filename: str):
+    import rdflib
+    
+    g = rdflib.Graph()
+    g.parse(filename, format=rdflib.util.guess_format(filename) or 'turtle')
+    log.info('Loading %u triples from "%s"', len(g), filename)
+    
+    step = max(batch_size, 1)
+    triples = graph_clauses(g)
+    for i in range(0, len(triples), step):
+        await batch_commit(triples[i:i+step])
+    
+    return await rdf_store()
+
+###############################################################################
+########################################################################## sync
+
+# The desired model is built into a local graph and compared to the manifest
+# of triples pushed by the previous sync. Only the delta is sent, so the
+# delete part of model_ensure_relationship(onlyobj=True) ends up in the same
+# diff. The manifest must describe the server contents; remove it to force a
+# full push. The entity index is not consulted, as every name in the desired
+# model is minted deterministically from its label.
+
+async def sync (manifest: str):
+    global graph
+    import rdflib
+    
+    # build desired model locally
+    graph = rdflib.Graph()
+    await process()
+    await batch_flush()
+    desired = set(graph_clauses(graph))
+    graph = None
+    
+    # model pushed by previous sync
+    previous = set()
+    if os.path.exists(manifest):
+        with open(manifest) as fo:
+            previous = set(line.rstrip('\n') for line in fo)
+    
+    delete = sorted(previous - desired)
+    insert = sorted(desired - previous)
+    log.info('Syncing %u deletions and %u insertions (%u unchanged)', len(delete), len(insert), len(desired & previous))
+    
+    if delete or insert:
+        step = max(batch_size, 1)
+        for i in range(0, len(delete), step):
+            await batch_commit(delete_clause=delete[i:i+step])
+        for i in range(0, len(insert), step):
+            await batch_commit(insert[i:i+step])
+        if not await rdf_store():
+            return False
+    
+    with open(manifest, 'w') as fo:
+        for line in sorted(desired):
+            fo.write('%s\n' % line)
+    return True
+
+###############################################################################
+######################################################################### graph
+
+# Offline backend: the model is built into an in-process rdflib graph and
+# written to a file in one go by graph_store(). The rdf_* functions dispatch
+# here when a graph is set up.
+
+def graph_namespaces ():
+    ns = dict(offline_namespaces)
+    ns['n'] = namespace
+    if args.namespaces:
+        with open(args.namespaces) as fo:
+            ns.update(json.load(fo)['namespaces'])
+    for entry in args.prefix:
+        prefix, iri = entry.split('=', 1)
+        ns[prefix] = iri
+    
+    if graph is not None:
+        for prefix in ns:
+            graph.bind(prefix, ns[prefix], replace=True)
+    return True, {'success': True, 'namespaces': ns}
+
+def graph_term (term: str):
+    import rdflib
+    
+    if term.startswith('?'):
+        return None
+    if term.startswith('"'):
+        return rdflib.Literal(term[1:-1])
+    if term.startswith('<'):
+        return rdflib.URIRef(term[1:-1])
+    
+    prefix, local = term.split(':', 1)
+    if prefix not in prefixes:
+        raise ValueError('Namespace not defined for prefix "%s" (see --prefix)' % prefix)
+    return rdflib.URIRef(prefixes[prefix]+local)
+
+def graph_triple (clause: str):
+    return tuple(map(graph_term, clause.split(' ', 2)))
+
+def graph_update (insert_clause: list = None, delete_clause: list = None):
+    # deletes come from model_ensure_relationship(onlyobj=True) where the where
+    # clause equals the delete clause, so variables simply act as wildcards
+    for clause in delete_clause or []:
+        graph.remove(graph_triple(clause))
+    for clause in insert_clause or []:
+        graph.add(graph_triple(clause))
+    return True
+
+def graph_query (query: str):
+    rs = graph.query(query, initNs=prefixes)
+    return True, [[str(value) for value in row] for row in rs]
+
+def graph_clauses (g):
+    return ['%s %s %s' % (sub.n3(), pred.n3(), obj.n3()) for sub, pred, obj in g]
+
+def graph_store ():
+    import rdflib
+    
+    fmt = args.format or rdflib.util.guess_format(args.output) or 'turtle'
+    graph.serialize(destination=args.output, format=fmt, encoding='utf-8')
+    log.info('Successfully stored model in "%s" (%u triples)', args.output, len(graph))
+    return True
+
+###############################################################################
+######################################################################## stream
+
+# Offline backend writing N-Triples straight to the output file. Nothing is
+# kept in memory, so the model size is only bounded by disk.
+
+def stream_term (term: str):
+    if term.startswith('"'):
+        value = term[1:-1]
+        for c, e in [('\\', '\\\\'), ('"', '\\"'), ('\n', '\\n'), ('\r', '\\r')]:
+            value = value.replace(c, e)
+        return '"%s"' % value
+    if term.startswith('<'):
+        return term
+    
+    prefix, local = term.split(':', 1)
+    if prefix not in prefixes:
+        raise ValueError('Namespace not defined for prefix "%s" (see --prefix)' % prefix)
+    return '<%s%s>' % (prefixes[prefix], local)
+
+def stream_update (insert_clause: list = None, delete_clause: list = None):
+    if delete_clause:
+        raise ValueError('Deletes are not supported when streaming N-Triples')
+    for clause in insert_clause or []:
+        stream.write('%s .\n' % ' '.join(map(stream_term, clause.split(' ', 2))))
+    return True
+
+def stream_query (query: str):
+    # nothing written so far can be queried back
+    return True, []
+
+def stream_store ():
+    stream.flush()
+    log.info('Successfully stored model in "%s"', args.output)
+    return True
+
+###############################################################################
+######################################################################## shards
+
+# The buildings are split into contiguous ranges, each generated by a worker
+# process running this script with a streamed N-Triples shard as output. Names
+# are minted deterministically from per-building labels, so the shards never
+# collide and can simply be concatenated (or bulk-loaded one by one).
+
+async def shard ():
+    buildings    = range(args.first_building, args.first_building+args.buildings)
+    label_prefix = process_label_prefix(topology_load(args.topology), buildings)
+    jobs         = min(args.jobs, len(buildings))
+    
+    workers = []
+    for job in range(jobs):
+        part = buildings[job*len(buildings)//jobs:(job+1)*len(buildings)//jobs]
+        filename = '%s.%u' % (args.output, job)
+        log.info('Generating buildings %u-%u into "%s"', part[0], part[-1], filename)
+        
+        # later options override earlier ones
+        argv = ['--log-level', 'warning']+sys.argv[1:]+['--output', filename, '--format', 'nt', '--label-prefix', label_prefix,
+                             '--first-building', str(part[0]), '--buildings', str(len(part)), '--jobs', '1']
+        if args.stats: argv += ['--stats', '%s.%u' % (args.stats, job)]
+        if args.trace: argv += ['--trace', '%s.%u' % (args.trace, job)]
+        worker = await asyncio.create_subprocess_exec(sys.executable, os.path.abspath(__file__), *argv)
+        workers.append((worker, filename))
+    
+    failed = False
+    for worker, filename in workers:
+        if await worker.wait() != 0:
+            log.error('Worker generating "%s" failed', filename)
+            failed = True
+    if failed:
+        sys.exit(6)
+    
+    # concatenate shards
+    with open(args.output, 'wb') as fo:
+        for worker, filename in workers:
+            with open(filename, 'rb') as fi:
+                shutil.copyfileobj(fi, fo)
+            if not args.keep_shards:
+                os.remove(filename)
+    log.info('Successfully stored model in "%s" (%u shards)', args.output, len(workers))
+    
+    # merge per-worker instrumentation (span start times are per process)
+    for job in range(len(workers)):
+        if args.stats:
+            stats_merge('%s.%u' % (args.stats, job))
+            os.remove('%s.%u' % (args.stats, job))
+        if args.trace:
+            with open('%s.%u' % (args.trace, job)) as fi:
+                shutil.copyfileobj(fi, trace)
+            os.remove('%s.%u' % (args.trace, job))
 
 ###############################################################################
 ########################################################################## main
 
 async def main():
-    global namespaces
+    global namespaces, session, inflight, graph, stream, aiohttp
+    
+    # parallel offline generation
+    if args.jobs>1:
+        await shard()
+        return
     
+    # offline backend
+    if args.output and (args.format in ['nt', 'ntriples'] or (not args.format and args.output.endswith('.nt'))):
+        with open(args.output, 'w', encoding='utf-8') as stream:
+            await run()
+        return
+    if args.output:
+        import rdflib
+        graph = rdflib.Graph()
+        await run()
+        return
+    
+    # shared http client (imported here, offline runs never need it)
+    import aiohttp
+    connector = aiohttp.TCPConnector(limit=args.max_connections, keepalive_timeout=args.keepalive)
+    timeout   = aiohttp.ClientTimeout(total=args.timeout)
+    session   = aiohttp.ClientSession(connector=connector, timeout=timeout)
+    inflight  = asyncio.Semaphore(args.max_inflight)
+    try:
+        await run()
+    finally:
+        await session.close()
+
+async def run():
     # load namespaces
-    print('STATUS: Loading namespaces:')
+    log.info('Loading namespaces:')
     success, ns = await rdf_namespaces()
     if not success or not 'success' in ns or not ns['success']:
-        print('ERROR: Unable to fetch namespaces:')
-        print(success)
-        print(ns)
+        log.error('Unable to fetch namespaces: %s %s', success, ns)
         sys.exit(3)
     for key in ns['namespaces']:
         prefix = ns['namespaces'][key]
-        print('STATUS: - %s : %s' % (prefix, key))
-        namespaces[prefix] = key
+        log.info('- %s : %s', prefix, key)
+        namespaces[prefix] = key+':'
+        prefixes[key] = prefix
+    
+    # bulk-load a previously generated model
+    if args.load:
+        await rdf_load(args.load)
+        return
+    
+    # push only the difference to the previous run
+    if args.sync:
+        await sync(args.sync)
+        return
+    
+    # resume from journal of an earlier run
+    if args.journal:
+        journal_open(args.journal)
+    
+    # load index of existing entities
+    log.info('Loading entity index')
+    if not await index_load():
+        log.error('Unable to load entity index')
+        sys.exit(4)
+    log.info('- %u entities', len(instances))
     
     await process()
+    
+    # store resulting model
+    await batch_flush()
+    await rdf_store()
 
 # guard: python version
 if not valid_python_version():
-    print('ERROR: Invalid python version (%s), bust be 3.(5+).' % str(sys.version_info))
+    print('ERROR: Invalid python version (%s), bust be 3.(6+).' % str(sys.version_info))
     sys.exit(1)
 
 # guard: commandline arguments
-if len(sys.argv) != 4:
-    print('Syntax: %s NAMESPACE RDF_SERVER_HOST RDF_SERVER_PORT' % sys.argv[0])
-    print('        %s http://ss.sdu.dk/test/grundstrup-bidi/20200727/# 127.0.0.1 8001' % sys.argv[0])
-    sys.exit(2)
+parser = argparse.ArgumentParser(epilog='example: %s http://ss.sdu.dk/test/grundstrup-bidi/20200727/# 127.0.0.1 8001' % sys.argv[0])
+parser.add_argument('namespace', metavar='NAMESPACE')
+parser.add_argument('host'     , metavar='RDF_SERVER_HOST', nargs='?')
+parser.add_argument('port'     , metavar='RDF_SERVER_PORT', nargs='?', type=int)
+parser.add_argument('--topology', metavar='FILE', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'var', 'topologies', 'grundstrup.json'),
+                    help='plant topology spec (default: var/topologies/grundstrup.json)')
+parser.add_argument('--buildings', type=int, default=1,
+                    help='number of buildings to stamp out from the topology (default: %(default)s)')
+parser.add_argument('--first-building', type=int, default=1,
+                    help='number of the first building (default: %(default)s)')
+parser.add_argument('--label-prefix', metavar='TEMPLATE',
+                    help='label prefix overriding the topology, e.g. "b{building}_"')
+parser.add_argument('--window', type=int, default=16,
+                    help='buildings scheduled before waiting for them to finish (default: %(default)s)')
+parser.add_argument('--output', metavar='FILE',
+                    help='build the model into FILE instead of on the server (offline backend), .nt files are streamed')
+parser.add_argument('--format',
+                    help='rdflib serialization format of --output (default: guessed from file extension)')
+parser.add_argument('--jobs', type=int, default=1,
+                    help='worker processes generating shards of a streamed .nt --output (default: %(default)s)')
+parser.add_argument('--keep-shards', action='store_true',
+                    help='keep the per-worker shards next to the concatenated --output')
+parser.add_argument('--namespaces', metavar='FILE',
+                    help='offline namespace map, in the format served by /namespaces')
+parser.add_argument('--prefix', metavar='PREFIX=IRI', action='append', default=[],
+                    help='offline namespace binding, may be repeated (e.g. dao=...)')
+parser.add_argument('--namespace-cache', metavar='FILE',
+                    help='cache the namespace map of the server in FILE')
+parser.add_argument('--namespace-ttl', type=float, default=3600,
+                    help='seconds a cached namespace map is used before it is fetched again (default: %(default)s)')
+parser.add_argument('--sync', metavar='MANIFEST',
+                    help='only push triples changed since the sync that wrote MANIFEST')
+parser.add_argument('--load', metavar='FILE',
+                    help='bulk-load a generated model FILE into the server instead of building the model')
+parser.add_argument('--batch-size', type=int, default=batch_size,
+                    help='triples per update request, 0 sends one request per triple (default: %(default)s)')
+parser.add_argument('--journal', metavar='FILE',
+                    help='append operations acknowledged by the server to FILE and skip those already in it (resume)')
+parser.add_argument('--retries', type=int, default=5,
+                    help='retries of a request failing with a connection error or 5xx status (default: %(default)s)')
+parser.add_argument('--backoff', type=float, default=0.5,
+                    help='seconds before the first retry, doubled for each further retry (default: %(default)s)')
+parser.add_argument('--log-level', default='info', choices=['debug', 'info', 'warning', 'error'],
+                    help='debug also logs every request on the hot path (default: %(default)s)')
+parser.add_argument('--stats', metavar='FILE',
+                    help='write per request type counters, timings and bytes as json to FILE at exit')
+parser.add_argument('--trace', metavar='FILE',
+                    help='write one json span per request to FILE')
+parser.add_argument('--max-connections', type=int, default=8,
+                    help='size of the http connection pool (default: %(default)s)')
+parser.add_argument('--max-inflight', type=int, default=8,
+                    help='maximum number of concurrent requests (default: %(default)s)')
+parser.add_argument('--keepalive', type=float, default=30,
+                    help='seconds an idle connection is kept open (default: %(default)s)')
+parser.add_argument('--timeout', type=float, default=300,
+                    help='total timeout in seconds for a single request (default: %(default)s)')
+args = parser.parse_args()
+if not args.output and (args.host==None or args.port==None):
+    parser.error('RDF_SERVER_HOST and RDF_SERVER_PORT are required unless --output is given')
+if args.output and args.load:
+    parser.error('--load requires a server, it cannot be combined with --output')
+if args.output and args.sync:
+    parser.error('--sync requires a server, it cannot be combined with --output')
+if args.journal and (args.output or args.sync or args.load):
+    parser.error('--journal records acknowledgements of a server build, it cannot be combined with --output, --sync or --load')
+if args.jobs>1 and not (args.output and (args.format in ['nt', 'ntriples'] or (not args.format and args.output.endswith('.nt')))):
+    parser.error('--jobs requires a streamed N-Triples --output')
+
+# logging
+logging.basicConfig(level=args.log_level.upper(), format='%(levelname)s: %(message)s')
+if args.trace:
+    trace = open(args.trace, 'w')
 
 # extract parameters
-namespace   =     sys.argv[1]
-host        =     sys.argv[2]
-port        = int(sys.argv[3])
+namespace   = args.namespace
+host        = args.host
+port        = args.port
+batch_size  = args.batch_size
 
 loop = asyncio.get_event_loop()
 
@@ -332,9 +1007,11 @@ try:
     loop.run_until_complete(main())
 except KeyboardInterrupt:
     print('')
-    print('STATUS: Exiting ...')
+    log.info('Exiting ...')
     loop.close()
     exit(0)
+finally:
+    stats_report()
 
 ########################################################################### EOF
 ###############################################################################
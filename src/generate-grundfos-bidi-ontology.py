@@ -1,15 +1,14 @@
 #!/usr/bin/env python3
 
 import sys
-from rdflib import Graph, Namespace, URIRef, Literal
-import rdflib
+import os
+import hashlib
 
 ###############################################################################
 ####################################################################### helpers
 
 def insert (triple):
-    if triple in g: return
-    g.add(triple)
+    staged.add(triple)
 
 def restrict (subs, pred, objs):
     for sub in subs:
@@ -61,16 +60,65 @@ def create_class (ns, name, parent=None, label=None):
     
     return entity
 
+def closure (triples, pred):
+    parents = {}
+    for sub, p, obj in triples:
+        if p == pred:
+            parents.setdefault(sub, set()).add(obj)
+    
+    # reflexive and transitive, so one step answers what pred* would, but only
+    # for nodes the ontology mentions (model-only types get no reflexive triple)
+    result = set()
+    nodes = set(parents).union(*parents.values())
+    for node in nodes:
+        seen = set([node])
+        todo = [node]
+        while todo:
+            for parent in parents.get(todo.pop(), []):
+                if not parent in seen:
+                    seen.add(parent)
+                    todo.append(parent)
+        for ancestor in seen:
+            result.add( (node, pred, ancestor) )
+    return result
+
+def store (filename, triples, lines):
+    if filename.endswith('.nt'):
+        # stream n-triples straight from the staged set
+        with open(filename, 'w', encoding='utf-8') as fo:
+            fo.writelines(lines)
+        return
+    
+    g = Graph()
+    
+    g.bind('rdf'   , RDF)
+    g.bind('rdfs'  , RDFS)
+    g.bind('owl'   , OWL)
+    g.bind('xsd'   , XSD)
+    g.bind('brick' , BRICK)
+    g.bind('gfb', GFB)
+    
+    g.addN((sub, pred, obj, g) for sub, pred, obj in triples)
+    g.serialize(filename, 'turtle')
+
+def ntriples (triples):
+    return sorted('%s %s %s .\n' % (sub.n3(), pred.n3(), obj.n3()) for sub, pred, obj in triples)
+
 ###############################################################################
 #################################################################### main start
 
 # guard: commandline arguments
-if len(sys.argv) != 2:
-    print('Syntax: %s OUTPUT_FILE' % sys.argv[0])
+if len(sys.argv) not in [2, 3]:
+    print('Syntax: %s OUTPUT_FILE [INFERRED_FILE]' % sys.argv[0])
     print('        %s grundfos-bidi.ttl' % sys.argv[0])
+    print('        %s grundfos-bidi.ttl grundfos-bidi-inferred.ttl' % sys.argv[0])
     sys.exit(1)
 
-output_filename = sys.argv[1]
+output_filename   = sys.argv[1]
+inferred_filename = sys.argv[2] if len(sys.argv)==3 else None
+
+# imported after the guard, rdflib dominates startup time
+from rdflib import Graph, Namespace, URIRef, Literal
 
 # external namespaces
 RDF   = Namespace('http://www.w3.org/1999/02/22-rdf-syntax-ns#')
@@ -81,14 +129,8 @@ BRICK = Namespace('https://brickschema.org/schema/1.1.0/Brick#')
 
 GFB   = Namespace('http://ss.sdu.dk/test/grundstrup-bidi-ontology/20200727/#')
 
-g = Graph()
-
-g.bind('rdf'   , RDF)
-g.bind('rdfs'  , RDFS)
-g.bind('owl'   , OWL)
-g.bind('xsd'   , XSD)
-g.bind('brick' , BRICK)
-g.bind('gfb', GFB)
+# triples are staged in a set and loaded into the graph in one go
+staged = set()
 
 ###############################################################################
 ###################################################################### ontology
@@ -123,7 +165,33 @@ feedsReturnDomesticHeatedWater = create_property(GFB, 'feedsReturnDomesticHeated
 ###############################################################################
 ######################################################################### store
 
-g.serialize(output_filename, 'turtle')
+lines = ntriples(staged)
+
+# skip regeneration when the definitions are unchanged since the last run, every
+# output file has its own digest so a stale one is never taken as current
+digest = hashlib.sha256(''.join(lines).encode('utf-8')).hexdigest()
+filenames = [output_filename]+([inferred_filename] if inferred_filename else [])
+
+def up_to_date (filename):
+    if not (os.path.exists(filename) and os.path.exists(filename+'.sha256')):
+        return False
+    with open(filename+'.sha256') as fo:
+        return fo.read().strip() == digest
+
+if all(map(up_to_date, filenames)):
+    print('NOTICE: Ontology "%s" is up to date' % output_filename)
+    sys.exit(0)
+
+store(output_filename, staged, lines)
+
+# materialized subclass / subproperty closure
+if inferred_filename:
+    inferred = closure(staged, RDFS.subClassOf) | closure(staged, RDFS.subPropertyOf)
+    store(inferred_filename, inferred, ntriples(inferred))
+
+for filename in filenames:
+    with open(filename+'.sha256', 'w') as fo:
+        fo.write(digest+'\n')
 
 ########################################################################### EOF
 ###############################################################################
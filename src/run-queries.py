@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+import argparse
+import asyncio
+import hashlib
+import json
+from concurrent.futures import ProcessPoolExecutor
+
+# namespaces known without a server, extended by --namespaces, --prefix and --server
+default_namespaces = {
+    'rdf'  : 'http://www.w3.org/1999/02/22-rdf-syntax-ns#',
+    'rdfs' : 'http://www.w3.org/2000/01/rdf-schema#',
+    'owl'  : 'http://www.w3.org/2002/07/owl#',
+    'xsd'  : 'http://www.w3.org/2001/XMLSchema#',
+    'brick': 'https://brickschema.org/schema/1.1.0/Brick#',
+    'gfb'  : 'http://ss.sdu.dk/test/grundstrup-bidi-ontology/20200727/#',
+}
+
+queries  = {}   # name -> query text
+prefixes = {}   # prefix -> namespace iri
+cache    = None # result cache directory
+prepared = {}   # name -> prepared query, compiled once per process
+
+###############################################################################
+####################################################################### helpers
+
+def load_queries (directory: str):
+    result = {}
+    for filename in sorted(os.listdir(directory)):
+        if filename.endswith('.rq'):
+            with open(os.path.join(directory, filename)) as fo:
+                result[filename[:-3]] = fo.read()
+    return result
+
+def digest (data: bytes):
+    return hashlib.sha256(data).hexdigest()
+
+def cache_key (model_digest: str, name: str):
+    return digest(json.dumps([model_digest, queries[name], prefixes], sort_keys=True).encode('utf-8'))
+
+def cache_load (key: str):
+    if not cache or not os.path.exists(os.path.join(cache, '%s.json' % key)):
+        return None
+    with open(os.path.join(cache, '%s.json' % key)) as fo:
+        return json.load(fo)
+
+def cache_store (key: str, rows: list):
+    if cache:
+        filename = os.path.join(cache, '%s.json' % key)
+        with open(filename+'.tmp', 'w') as fo:
+            json.dump(rows, fo)
+        os.replace(filename+'.tmp', filename)
+
+def file_digest (filename: str):
+    h = hashlib.sha256()
+    with open(filename, 'rb') as fo:
+        for chunk in iter(lambda: fo.read(1<<20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+###############################################################################
+######################################################################### local
+
+def init (_queries: dict, _prefixes: dict, _cache: str):
+    global queries, prefixes, cache
+    queries  = _queries
+    prefixes = _prefixes
+    cache    = _cache
+
+def prepare (name: str):
+    if not name in prepared:
+        from rdflib.plugins.sparql import prepareQuery
+        prepared[name] = prepareQuery(queries[name], initNs=prefixes)
+    return prepared[name]
+
+def run_model (filename: str):
+    # results are cached per (model content, query text, prefixes)
+    model_digest = file_digest(filename)
+    graph  = None
+    result = {}
+    for name in queries:
+        key = cache_key(model_digest, name)
+        rows = cache_load(key)
+        if rows != None:
+            result[name] = rows
+            continue
+        
+        # only parse the model when some query is not cached
+        if graph == None:
+            import rdflib
+            graph = rdflib.Graph()
+            graph.parse(filename, format=rdflib.util.guess_format(filename) or 'turtle')
+        
+        rows = [[None if value==None else str(value) for value in row] for row in graph.query(prepare(name))]
+        result[name] = rows
+        cache_store(key, rows)
+    return result
+
+###############################################################################
+######################################################################## server
+
+async def server_request (session, method: str, path: str, data: str):
+    url = 'http://%s/%s' % (args.server, path)
+    async with session.request(method, url, data=data) as response:
+        text = await response.text()
+        if response.status != 200:
+            print('ERROR: Request to "%s" failed with status "%d"' % (url, response.status))
+            print(text)
+            sys.exit(3)
+        return json.loads(text)
+
+async def server_namespaces ():
+    import aiohttp
+    async with aiohttp.ClientSession() as session:
+        ns = await server_request(session, 'POST', 'namespaces', '"dummy"')
+    return ns['namespaces']
+
+# The server offers no hash of its model. With --fingerprint, the result of a
+# cheap query stands in for one, and results are cached under it like those of
+# local models. The fingerprint must change whenever the model does; a triple
+# count is enough for models that only grow.
+
+async def run_server ():
+    import aiohttp
+    async with aiohttp.ClientSession() as session:
+        keys = {}
+        if cache and args.fingerprint:
+            with open(args.fingerprint) as fo:
+                r = await server_request(session, 'PUT', 'query', json.dumps(fo.read()))
+            model_digest = digest(json.dumps([args.server, r['resultset']]).encode('utf-8'))
+            keys = {name: cache_key(model_digest, name) for name in queries}
+        
+        result = {}
+        for name in keys:
+            rows = cache_load(keys[name])
+            if rows != None:
+                result[name] = rows
+        
+        names = [name for name in queries if not name in result]
+        rs = await asyncio.gather(*[server_request(session, 'PUT', 'query', json.dumps(queries[name])) for name in names])
+    for name, r in zip(names, rs):
+        result[name] = r['resultset']
+        if name in keys:
+            cache_store(keys[name], result[name])
+    return {name: result[name] for name in queries}
+
+###############################################################################
+########################################################################## main
+
+def main ():
+    queries.update(load_queries(args.queries))
+    if args.query:
+        for name in list(queries):
+            if not name in args.query:
+                del queries[name]
+    
+    # namespaces
+    prefixes.update(default_namespaces)
+    if args.namespaces:
+        with open(args.namespaces) as fo:
+            prefixes.update(json.load(fo)['namespaces'])
+    if args.server:
+        prefixes.update(asyncio.run(server_namespaces()))
+    for entry in args.prefix:
+        prefix, iri = entry.split('=', 1)
+        prefixes[prefix] = iri
+    
+    if args.cache:
+        os.makedirs(args.cache, exist_ok=True)
+    
+    results = {}
+    init(queries, prefixes, args.cache)
+    if args.models:
+        if args.jobs>1 and len(args.models)>1:
+            with ProcessPoolExecutor(args.jobs, initializer=init, initargs=(queries, prefixes, args.cache)) as pool:
+                results.update(zip(args.models, pool.map(run_model, args.models)))
+        else:
+            for model in args.models:
+                results[model] = run_model(model)
+    elif args.server:
+        results[args.server] = asyncio.run(run_server())
+    
+    json.dump(results, sys.stdout, indent=4)
+    print('')
+
+if __name__ == '__main__':
+    # guard: commandline arguments
+    parser = argparse.ArgumentParser(description='Run the queries in var/queries against model files or an RDF server.',
+                                     epilog='example: %s --server 127.0.0.1:8001 --cache /tmp/query-cache model1.ttl model2.ttl' % sys.argv[0])
+    parser.add_argument('models', metavar='MODEL', nargs='*',
+                        help='model files to query locally (default: query the --server)')
+    parser.add_argument('--server', metavar='HOST:PORT',
+                        help='RDF server providing namespaces, and answering the queries when no MODEL is given')
+    parser.add_argument('--queries', metavar='DIR', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'var', 'queries'),
+                        help='directory of .rq files (default: var/queries)')
+    parser.add_argument('--query', metavar='NAME', action='append',
+                        help='only run the named query, may be repeated (e.g. dao)')
+    parser.add_argument('--namespaces', metavar='FILE',
+                        help='namespace map, in the format served by /namespaces')
+    parser.add_argument('--prefix', metavar='PREFIX=IRI', action='append', default=[],
+                        help='namespace binding, may be repeated (e.g. dao=...)')
+    parser.add_argument('--cache', metavar='DIR',
+                        help='cache results in DIR, keyed by model content hash (or --fingerprint for the server)')
+    parser.add_argument('--fingerprint', metavar='FILE',
+                        help='query whose result identifies the server model, enables --cache for the server (e.g. a triple count)')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count(),
+                        help='worker processes when querying several models (default: %(default)s)')
+    args = parser.parse_args()
+    if not args.models and not args.server:
+        parser.error('give at least one MODEL or --server')
+    
+    main()
+
+########################################################################### EOF
+###############################################################################
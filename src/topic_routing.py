@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+import json
+import time
+
+from topology_index import load_triples, RDF
+
+###############################################################################
+######################################################################### index
+
+# Maps broker -> topic -> list of (entity iri, entity types), built from the
+# dao:MqttLiveData nodes written by attach_mqtt_dao. Exported as a small json
+# document, so loading it is a single json.load and every lookup is two dict
+# hits; message routing never has to query the RDF server.
+
+class RoutingIndex:
+    
+    def __init__ (self, brokers: dict):
+        self.brokers = brokers
+    
+    @classmethod
+    def build (cls, triples, dao: str):
+        data     = {} # data node -> {'broker', 'topic', 'entity'}
+        types    = {} # node -> set of type iris
+        livedata = set()
+        for sub, pred, obj in triples:
+            if pred == dao+'hasMqttLiveData':
+                data.setdefault(obj, {})['entity'] = sub
+            elif pred == dao+'hasBroker':
+                data.setdefault(sub, {})['broker'] = obj
+            elif pred == dao+'hasTopic':
+                data.setdefault(sub, {})['topic'] = obj
+            elif pred == RDF+'type':
+                types.setdefault(sub, set()).add(obj)
+                if obj == dao+'MqttLiveData':
+                    livedata.add(sub)
+        
+        brokers = {}
+        for node in livedata:
+            binding = data.get(node, {})
+            if not ('entity' in binding and 'broker' in binding and 'topic' in binding):
+                continue
+            entity = binding['entity']
+            topics = brokers.setdefault(binding['broker'], {})
+            topics.setdefault(binding['topic'], []).append([entity, sorted(types.get(entity, []))])
+        
+        for topics in brokers.values():
+            for routes in topics.values():
+                routes.sort()
+        return cls(brokers)
+    
+    @classmethod
+    def load (cls, filename: str):
+        with open(filename) as fo:
+            return cls(json.load(fo)['brokers'])
+    
+    def store (self, filename: str):
+        with open(filename+'.tmp', 'w') as fo:
+            json.dump({'version': 1, 'brokers': self.brokers}, fo, separators=(',', ':'), sort_keys=True)
+        os.replace(filename+'.tmp', filename)
+    
+    def route (self, broker: str, topic: str):
+        # list of (entity iri, entity types) receiving messages on topic
+        topics = self.brokers.get(broker)
+        if topics == None:
+            return []
+        return topics.get(topic, [])
+
+###############################################################################
+########################################################################## main
+
+if __name__ == '__main__':
+    # guard: commandline arguments
+    if len(sys.argv) not in [3, 4]:
+        print('Syntax: %s MODEL_FILE INDEX_FILE [DAO_NAMESPACE]' % sys.argv[0])
+        print('        %s model.ttl routing.json' % sys.argv[0])
+        print('        %s model.nt routing.json http://example.org/dao#' % sys.argv[0])
+        sys.exit(1)
+    
+    model_filename = sys.argv[1]
+    index_filename = sys.argv[2]
+    if len(sys.argv)==3 and model_filename.endswith('.nt'):
+        print('ERROR: N-Triples models bind no prefixes, give DAO_NAMESPACE')
+        sys.exit(2)
+    
+    # turtle models written by bidi-generator.py bind the dao prefix
+    t0 = time.perf_counter()
+    namespaces = {}
+    triples = load_triples(model_filename, namespaces)
+    dao = sys.argv[3] if len(sys.argv)==4 else namespaces.get('dao')
+    if dao == None:
+        print('ERROR: Model does not bind the dao prefix, give DAO_NAMESPACE')
+        sys.exit(2)
+    
+    index = RoutingIndex.build(triples, dao)
+    index.store(index_filename)
+    t1 = time.perf_counter()
+    
+    index = RoutingIndex.load(index_filename)
+    t2 = time.perf_counter()
+    
+    topics = sum(len(topics) for topics in index.brokers.values())
+    print('STATUS: Indexed %u topics on %u brokers in %.3f s, loaded in %.3f s' % (topics, len(index.brokers), t1-t0, t2-t1))
+
+########################################################################### EOF
+###############################################################################
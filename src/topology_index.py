@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+
+import sys
+import time
+from array import array
+
+RDF   = 'http://www.w3.org/1999/02/22-rdf-syntax-ns#'
+RDFS  = 'http://www.w3.org/2000/01/rdf-schema#'
+BRICK = 'https://brickschema.org/schema/1.1.0/Brick#'
+GFB   = 'http://ss.sdu.dk/test/grundstrup-bidi-ontology/20200727/#'
+
+# predicates walked by the index, each gets its own adjacency arrays
+predicates = [
+    GFB+'feedsSupplyDistrictHeatedWater',
+    GFB+'feedsReturnDistrictHeatedWater',
+    GFB+'feedsSupplyHeatedWater',
+    GFB+'feedsReturnHeatedWater',
+    GFB+'controls',
+    BRICK+'isPointOf',
+]
+
+###############################################################################
+####################################################################### helpers
+
+def load_triples (filename: str, namespaces: dict = None):
+    # fast path for the n-triples written by bidi-generator.py
+    if filename.endswith('.nt'):
+        return load_ntriples(filename)
+    
+    # parsed right away, so namespaces (prefix -> iri) is filled on return
+    import rdflib
+    g = rdflib.Graph()
+    g.parse(filename, format=rdflib.util.guess_format(filename) or 'turtle')
+    if namespaces != None:
+        namespaces.update((prefix, str(iri)) for prefix, iri in g.namespaces())
+    return ((str(sub), str(pred), str(obj)) for sub, pred, obj in g)
+
+def load_ntriples (filename: str):
+    with open(filename, encoding='utf-8') as fo:
+        for line in fo:
+            line = line.strip()
+            if line=='' or line.startswith('#'): continue
+            sub, pred, obj = line[:-1].rstrip().split(' ', 2)
+            yield term(sub), term(pred), term(obj)
+
+def term (value: str):
+    if value.startswith('<'):
+        return value[1:-1]
+    if value.startswith('"'):
+        value = value[1:value.rindex('"')]
+        for e, c in [('\\"', '"'), ('\\n', '\n'), ('\\r', '\r'), ('\\\\', '\\')]:
+            value = value.replace(e, c)
+    return value
+
+###############################################################################
+######################################################################### index
+
+# Nodes get integer ids. For every predicate the edges are stored CSR-style:
+# the successors of node i are targets[offsets[i]:offsets[i+1]], with a second
+# pair of arrays for the reverse direction. Reachability is a breadth-first
+# walk over those arrays (cycles such as the loop 2 bypass are cut by the
+# visited set) and is memoized per (predicate, direction, node).
+
+class TopologyIndex:
+    
+    def __init__ (self, triples, ontology=None):
+        self.ids    = {}
+        self.nodes  = []
+        self.types  = {} # node id -> set of type iris
+        self.labels = {} # node id -> label
+        self.memo   = {}
+        
+        edges = {pred: [] for pred in predicates}
+        for sub, pred, obj in triples:
+            if pred in edges:
+                edges[pred].append((self.node(sub), self.node(obj)))
+            elif pred==RDF+'type':
+                self.types.setdefault(self.node(sub), set()).add(obj)
+            elif pred==RDF+'label':
+                self.labels[self.node(sub)] = obj
+        
+        self.forward = {}
+        self.reverse = {}
+        for pred in predicates:
+            self.forward[pred] = self.csr(edges[pred])
+            self.reverse[pred] = self.csr([(dst, src) for src, dst in edges[pred]])
+        
+        # class -> itself and all its subclasses
+        self.subclasses = {}
+        if ontology:
+            parents = {}
+            for sub, pred, obj in ontology:
+                if pred==RDFS+'subClassOf':
+                    parents.setdefault(sub, set()).add(obj)
+            for cls in parents:
+                todo = [cls]
+                seen = set(todo)
+                while todo:
+                    for parent in parents.get(todo.pop(), []):
+                        if not parent in seen:
+                            seen.add(parent)
+                            todo.append(parent)
+                for parent in seen:
+                    self.subclasses.setdefault(parent, set([parent])).add(cls)
+    
+    @classmethod
+    def load (cls, filename: str, ontology_filename: str = None):
+        ontology = list(load_triples(ontology_filename)) if ontology_filename else None
+        return cls(load_triples(filename), ontology)
+    
+    def node (self, iri: str):
+        if not iri in self.ids:
+            self.ids[iri] = len(self.nodes)
+            self.nodes.append(iri)
+        return self.ids[iri]
+    
+    def csr (self, edges: list):
+        edges.sort()
+        offsets = array('l', [0])*(len(self.nodes)+1)
+        targets = array('l', [dst for src, dst in edges])
+        for src, dst in edges:
+            offsets[src+1] += 1
+        for i in range(len(self.nodes)):
+            offsets[i+1] += offsets[i]
+        return offsets, targets
+    
+    ########################################################### reachability
+    
+    def step (self, ids, pred, reverse: bool = False):
+        # pred is one predicate iri or a tuple of them (walked as their union)
+        result = set()
+        for p in ([pred] if type(pred)==str else pred):
+            offsets, targets = (self.reverse if reverse else self.forward)[p]
+            for i in ids:
+                result.update(targets[offsets[i]:offsets[i+1]])
+        return result
+    
+    def reach (self, i: int, pred, reverse: bool = False):
+        # nodes reachable in one or more steps (pred+)
+        key = (pred, reverse, i)
+        if key in self.memo:
+            return self.memo[key]
+        
+        seen = set()
+        todo = self.step([i], pred, reverse)
+        while todo:
+            seen |= todo
+            todo = self.step(todo, pred, reverse)-seen
+        
+        self.memo[key] = result = frozenset(seen)
+        return result
+    
+    def instances (self, cls: str):
+        key = ('instances', cls)
+        if not key in self.memo:
+            classes = self.subclasses.get(cls, set([cls]))
+            self.memo[key] = frozenset(i for i in self.types if self.types[i] & classes)
+        return self.memo[key]
+    
+    ############################################################# public api
+    
+    def downstream (self, iri: str, pred):
+        return set(self.nodes[i] for i in self.reach(self.ids[iri], pred))
+    
+    def upstream (self, iri: str, pred):
+        return set(self.nodes[i] for i in self.reach(self.ids[iri], pred, True))
+    
+    def hx_radiator (self):
+        # var/queries/hx-radiator.rq
+        radiators = self.instances(GFB+'Radiator')
+        result = set()
+        for hx in self.instances(GFB+'Heat_Exchanger'):
+            for rad in self.reach(hx, GFB+'feedsSupplyHeatedWater') & radiators:
+                result.add((self.labels.get(hx), self.labels.get(rad)))
+        return sorted(result)
+    
+    def meter_pump (self):
+        # var/queries/meter-pump.rq
+        temps = self.instances(GFB+'Water_Temperature_Sensor')
+        flows = self.instances(GFB+'Water_Flow_Sensor')
+        hxs   = self.instances(GFB+'Heat_Exchanger')
+        pumps = self.instances(GFB+'Pump')
+        
+        result = set()
+        for hm in self.instances(GFB+'Heat_Meter'):
+            controllers = self.step([hm], GFB+'controls', True)
+            for st in controllers & temps:
+                for hx in self.reach(st, GFB+'feedsSupplyDistrictHeatedWater') & hxs:
+                    returns = self.reach(hx, GFB+'feedsReturnDistrictHeatedWater') & controllers
+                    if not (returns & temps and returns & flows):
+                        continue
+                    
+                    # feedsSupplyHeatedWater+/feedsReturnHeatedWater*
+                    for n in self.reach(hx, GFB+'feedsSupplyHeatedWater'):
+                        for p in (self.reach(n, GFB+'feedsReturnHeatedWater') | set([n])) & pumps:
+                            result.add((self.labels.get(hm), self.labels.get(p)))
+        return sorted(result)
+
+###############################################################################
+########################################################################## main
+
+if __name__ == '__main__':
+    # guard: commandline arguments
+    if len(sys.argv) not in [2, 3]:
+        print('Syntax: %s MODEL_FILE [ONTOLOGY_FILE]' % sys.argv[0])
+        print('        %s model.nt grundfos-bidi.ttl' % sys.argv[0])
+        sys.exit(1)
+    
+    t0 = time.perf_counter()
+    index = TopologyIndex.load(sys.argv[1], sys.argv[2] if len(sys.argv)==3 else None)
+    t1 = time.perf_counter()
+    print('STATUS: Indexed %u nodes in %.3f s' % (len(index.nodes), t1-t0))
+    
+    for name, query in [('hx-radiator', index.hx_radiator), ('meter-pump', index.meter_pump)]:
+        t0 = time.perf_counter()
+        rs = query()
+        t1 = time.perf_counter()
+        print('STATUS: %s: %u rows in %.1f us' % (name, len(rs), (t1-t0)*1e6))
+        for row in rs:
+            print('        %s' % ' '.join(row))
+
+########################################################################### EOF
+###############################################################################